@@ -1,15 +1,58 @@
+import os
 import numpy as np
 import cv2
 
+# The callers already run OpenCV functions from several pool threads at once,
+# so keep OpenCV's own threading to half the cores to avoid oversubscription
+cv2.setNumThreads(max(1, (os.cpu_count() or 2) // 2))
+
 def translate_image(image, shiftx, shifty):
+    image = np.ascontiguousarray(image)
     h,w = image.shape[:2]
-    translation_matrix = np.float32([ [1,0,70], [0,1,110] ])   
-    translated = cv2.warpAffine(img, translation_matrix, (w, h))
+    translation_matrix = np.float32([ [1,0,shiftx], [0,1,shifty] ])
+    translated = cv2.warpAffine(image, translation_matrix, (w, h))
     return translated
 
 def rotate_image(image, angle):
+    # OpenCV copies non-contiguous input internally, do it once up front
+    image = np.ascontiguousarray(image)
     h,w = image.shape[:2]
     cX,cY = (w//2,h//2)
     M = cv2.getRotationMatrix2D((cX,cY),angle,1)
     rotated = cv2.warpAffine(image,M , (w,h),flags=cv2.INTER_LINEAR)
-    return rotated
\ No newline at end of file
+    return rotated
+
+def abs_diff(image1, image2, out):
+    # Single SIMD pass over the uint8 data, written into the given buffer
+    return cv2.absdiff(image1, image2, dst=out)
+
+def to_grey(image):
+    # Greyscale JPEGs are already single channel
+    if image.ndim == 2:
+        return image
+    # OpenCV uses the same BT.601 weights as the float dot product, in one uint8 pass
+    if image.shape[2] == 4:
+        return cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_RGB2GRAY)
+
+def reference_spectrum(image):
+    # Remove the mean, so the overall brightness does not dominate the correlation
+    image = image.astype(np.float32)
+    return np.conj(np.fft.rfft2(image - image.mean()))
+
+def find_shift(ref_spectrum, image):
+    # Integer shift at the peak of the cross-correlation with the reference spectrum
+    image = image.astype(np.float32)
+    xcorr = np.fft.irfft2(ref_spectrum * np.fft.rfft2(image - image.mean()), s=image.shape)
+    yoff, xoff = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+    # The correlation is circular, peaks past the middle are negative shifts
+    h,w = image.shape
+    if yoff > h//2:
+        yoff -= h
+    if xoff > w//2:
+        xoff -= w
+    return int(xoff), int(yoff)
+
+def blend(image1, image2, alpha):
+    # Weighted sum in one saturating uint8 pass, without float temporaries
+    return cv2.addWeighted(image1, 1 - alpha, image2, alpha, 0)
\ No newline at end of file
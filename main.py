@@ -1,28 +1,97 @@
+import json
 import os
+import re
 import sys
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QRadioButton, QLabel, QLineEdit, QFrame, QPushButton,
-    QGridLayout, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QButtonGroup
+    QGridLayout, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QButtonGroup, QProgressDialog,
+    QCheckBox
 )
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QObject, QEvent
+from PyQt5.QtCore import Qt, QObject, QEvent, QTimer, QThread, pyqtSignal
 import numpy as np
-import yaml
 import imageio
 from functools import partial
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
-from image_registration import chi2_shift
-from image_registration.fft_tools import shift
 import image_editing as image_edit
 
+# Number of scaled pixmaps kept for redrawing without conversion
+PIXMAP_CACHE_SIZE = 4
+# Number of morph frames that may wait to be written at once
+MAX_PENDING_WRITES = 8
+# Text accepted by the integer input fields
+INT_PATTERN = re.compile(r'-?\d+')
+
+def array_to_qimage(array):
+    # QImage wraps the numpy buffer without copying, which needs C-contiguous rows
+    array = np.ascontiguousarray(array)
+    # Greyscale frames are shown as they are instead of being expanded to RGB
+    image_format = QImage.Format_Grayscale8 if array.ndim == 2 else QImage.Format_RGB888
+    image = QImage(array.data, array.shape[1], array.shape[0], array.strides[0], image_format)
+    # Keep the buffer alive for as long as the QImage refers to it
+    image.ndarray = array
+    return image
+
+def load_image(path):
+    # Make the greyscale version for registration while the image is still in cache
+    image = imageio.imread(path)
+    return image, image_edit.to_grey(image)
+
+class Worker(QObject):
+    # Runs a long task on a worker thread and reports its progress back to the GUI
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+
+    def __init__(self, task, cancel_event):
+        super().__init__()
+        self.task = task
+        self.cancel_event = cancel_event
+
+    def run(self):
+        result = None
+        try:
+            result = self.task(self.progress.emit, self.cancel_event)
+        except Exception as e:
+            print(e)
+        self.finished.emit(result)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
+        # Coalesce bursts of redraw requests into a single redraw
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(10)
+        self.redraw_timer.timeout.connect(self.redrawPixmap)
+
+        # Redraws in quick succession scale fast, the final view is redrawn smoothly
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.setInterval(150)
+        self.smooth_timer.timeout.connect(self.finishRedraw)
+        self.smooth_redraw_pending = False
+
+        # Worker threads for registration and file writes, kept for the lifetime of the window
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+        # Registering, saving and morphing run on a worker thread, so the window stays responsive
+        self.worker_thread = None
+        self.worker = None
+        self.cancel_event = threading.Event()
+
         # Set up the user interface
         self.initUI()
         self.ref_image_idx = 0
         self.current_image_idx = 0
+        self.diff_image = None
+        self.grey_images = {}
+        self.needs_redraw = False
+        self.pixmap_cache = OrderedDict()
+        self.drawn_state = None
         self.installEventFilter(self)
         self.keyPressEvent = on_key_press
 
@@ -33,14 +102,27 @@ class MainWindow(QMainWindow):
     def initUI(self):
         # Load the last used folder from the config file, if present
         self.folder = None
-        if os.path.exists('config.yaml'):
+        if os.path.exists('config.json'):
             try:
-                with open('config.yaml', 'r') as f:
-                    config = yaml.safe_load(f)
+                with open('config.json', 'r') as f:
+                    config = json.load(f)
                     if 'folder' in config:
                         self.folder = config['folder']
             except Exception as e:
                 print(e)
+        elif os.path.exists('config.yaml'):
+            # Pick up the folder from the old YAML config once, the next save writes config.json.
+            # Only a plain 'folder: <path>' line is understood, anything else is ignored.
+            try:
+                with open('config.yaml', 'r') as f:
+                    for line in f:
+                        key, _, value = line.partition(':')
+                        value = value.strip()
+                        if key == 'folder' and os.path.isdir(value):
+                            self.folder = value
+                            break
+            except Exception as e:
+                print(e)
 
         # Create a central widget and set its layout
         central_widget = QFrame(self)
@@ -55,6 +137,16 @@ class MainWindow(QMainWindow):
         # Set the central widget of the main window
         self.setCentralWidget(central_widget)
 
+        # Progress of the long running tasks, blocks the window while a task runs
+        self.progress_dialog = QProgressDialog(self)
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(0)
+        # The dialog stays up until the task has really finished, finishTask closes it
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.canceled.connect(self.cancelTask)
+        self.progress_dialog.reset()
+
     def init_buttons(self):
         button_frame = QFrame(self)
         button_frame.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
@@ -92,6 +184,9 @@ class MainWindow(QMainWindow):
         # Create a button to save the images
         text_fps = QLabel('Frame rate', self)
 
+        # Create a checkbox to save the morph as a video instead of single images
+        self.chk_video = QCheckBox('As video', self)
+
         layout_buttons = QGridLayout(button_frame)
         layout_buttons.setContentsMargins(1, 1, 1, 1)
         layout_buttons.addWidget(btn_open, 0, 0)
@@ -102,6 +197,7 @@ class MainWindow(QMainWindow):
         layout_buttons.addWidget(btn_morph, 0, 3, 1, 2)
         layout_buttons.addWidget(text_fps, 1, 3)
         layout_buttons.addWidget(self.fps, 1, 4)
+        layout_buttons.addWidget(self.chk_video, 0, 5)
 
         self.layout.addWidget(button_frame, 0, 0)
 
@@ -116,12 +212,15 @@ class MainWindow(QMainWindow):
         # Create a labels to display the images
         self.ref_image = QLabel(self)
         self.ref_image.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
+        # Let the layout size the labels, not the pixmaps they show
+        self.ref_image.setMinimumSize(1, 1)
         text_ref = QLabel('Reference Image', self)
         text_ref.setAlignment(Qt.AlignCenter)
         text_ref.setMaximumHeight(20)
 
         self.current_image = QLabel(self)
         self.current_image.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
+        self.current_image.setMinimumSize(1, 1)
         text_current = QLabel('Current Image', self)
         text_current.setAlignment(Qt.AlignCenter)
         text_current.setMaximumHeight(20)
@@ -222,58 +321,189 @@ class MainWindow(QMainWindow):
         self.updatePixmap()
         self.image_list.blockSignals(False)
 
-    def get_image_data(self):
-        ref_im = self.images[self.ref_image_idx]
-        current_im = self.images[self.current_image_idx].copy()
-
-        if self.radio_buttons['rad_diff'].isChecked():
-            current_im = np.abs(ref_im - current_im)
-
-        return [ref_im, current_im]
+    def get_image_data(self, idx, diff_idx=None):
+        image = self.images[idx]
+
+        # Only build the difference image when it is actually shown
+        if diff_idx is not None:
+            ref_im = self.images[diff_idx]
+            # Reuse the difference buffer as long as the image size does not change
+            if self.diff_image is None or self.diff_image.shape != ref_im.shape:
+                self.diff_image = np.empty(ref_im.shape, dtype=np.uint8)
+            image = image_edit.abs_diff(ref_im, image, self.diff_image)
+
+        return image
+
+    def get_grey_image(self, idx):
+        # Greyscale versions are kept for the next registration until their image changes.
+        # They are stored as 8 bit, a quarter of the memory of float32.
+        grey = self.grey_images.get(idx)
+        if grey is None:
+            grey = image_edit.to_grey(self.images[idx])
+            self.grey_images[idx] = grey
+        return grey
+
+    def invalidatePixmaps(self):
+        # Image data changed, drop everything drawn from the old data
+        self.pixmap_cache.clear()
+        self.drawn_state = None
 
     def updatePixmap(self):
+        # Redraw on the next event loop pass, repeated calls until then are merged
+        self.redraw_timer.start()
+
+    def redrawPixmap(self):
         # Check if a folder has been selected and if there are any pixmaps
         if not hasattr(self, 'folder') or not hasattr(self, 'images'):
             return
 
-        im_data = self.get_image_data()
-        im_labels = [self.ref_image, self.current_image]
-        pixmaps = [self.ref_pixmap, self.current_pixmap]
-
-        for image_data, label, pixmap in zip(im_data, im_labels, pixmaps):
-            # Convert the array to a QImage
-            image = QImage(
-                image_data.data,
-                image_data.shape[1],
-                image_data.shape[0],
-                image_data.strides[0],
-                QImage.Format_RGB888
-            )
-            # Convert the QImage to a QPixmap
-            pixmap = QPixmap.fromImage(image)
-            label.setPixmap(pixmap.scaled(self.ref_image.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        # The folder had no images, so don't leave the previous folder's images on screen
+        if not self.images:
+            self.ref_image.clear()
+            self.current_image.clear()
+            self.drawn_state = None
+            return
+
+        # Nothing can be seen while hidden or minimized, redraw once shown again
+        if not self.isVisible() or self.isMinimized():
+            self.needs_redraw = True
+            return
+        self.needs_redraw = False
+
+        # Both labels share the reference label's size, so look it up once
+        target_size = self.ref_image.size()
+        diff_idx = self.ref_image_idx if self.radio_buttons['rad_diff'].isChecked() else None
+
+        # Skip the redraw if the labels already show this state in final quality
+        view_state = (self.ref_image_idx, self.current_image_idx, diff_idx, target_size.width(), target_size.height())
+        if view_state == self.drawn_state:
+            return
+
+        # Use fast scaling while redraws follow each other quickly, e.g. when stepping through the list
+        smooth = not self.smooth_timer.isActive()
+        self.smooth_redraw_pending = not smooth
+        self.smooth_timer.start()
+        transformation = Qt.SmoothTransformation if smooth else Qt.FastTransformation
+
+        conversion_flags = Qt.NoFormatConversion | Qt.NoOpaqueDetection
+        views = [
+            (self.ref_image, self.ref_image_idx, None),
+            (self.current_image, self.current_image_idx, diff_idx),
+        ]
+
+        for label, idx, diff_idx in views:
+            # Reuse the scaled pixmap if this view was already drawn at this size
+            key = (idx, diff_idx, target_size.width(), target_size.height())
+            pixmap = self.pixmap_cache.get(key)
+            if pixmap is not None:
+                self.pixmap_cache.move_to_end(key)
+                label.setPixmap(pixmap)
+                continue
+
+            image_data = self.get_image_data(idx, diff_idx)
+            image = array_to_qimage(image_data)
+            # Scale before converting so only the displayed size is copied into a QPixmap
+            image = image.scaled(target_size, Qt.KeepAspectRatio, transformation)
+            # Fast scaling keeps the 24 bit source format, match the 32 bit display format instead
+            if image.format() != QImage.Format_RGB32:
+                image = image.convertToFormat(QImage.Format_RGB32)
+            pixmap = QPixmap.fromImage(image, conversion_flags)
+            label.setPixmap(pixmap)
+
+            # Only keep final quality pixmaps
+            if smooth:
+                self.pixmap_cache[key] = pixmap
+                if len(self.pixmap_cache) > PIXMAP_CACHE_SIZE:
+                    self.pixmap_cache.popitem(last=False)
+
+        self.drawn_state = view_state if smooth else None
+
+    def finishRedraw(self):
+        # Replace the fast preview with a smoothly scaled one
+        if self.smooth_redraw_pending:
+            self.redrawPixmap()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.needs_redraw:
+            self.updatePixmap()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # Rescale to the new label size. Redraws are merged and scale fast while the
+        # window is being dragged, the smooth redraw follows once resizing stops.
+        self.updatePixmap()
+
+    def closeEvent(self, event):
+        # Stop a running task before shutting down the threads it uses
+        if self.worker_thread is not None:
+            self.cancel_event.set()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        self.executor.shutdown()
+        super().closeEvent(event)
+
+    def is_busy(self):
+        return self.worker_thread is not None
+
+    def cancelTask(self):
+        self.cancel_event.set()
+
+    def startTask(self, label, steps, task, on_finished=None):
+        # Run task(progress, cancel_event) on the worker thread, on_finished gets its result on the GUI thread.
+        # Each task gets its own cancel event, so a late cancel cannot leak into the next task.
+        self.cancel_event = threading.Event()
+        self.progress_dialog.setLabelText(label)
+        self.progress_dialog.setRange(0, steps)
+        self.progress_dialog.setValue(0)
+
+        self.worker_thread = QThread(self)
+        self.worker = Worker(task, self.cancel_event)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.progress_dialog.setValue)
+        if on_finished is not None:
+            self.worker.finished.connect(on_finished)
+        self.worker.finished.connect(self.finishTask)
+        self.worker_thread.start()
+
+    def finishTask(self):
+        self.progress_dialog.reset()
+        self.progress_dialog.hide()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker_thread.deleteLater()
+        self.worker_thread = None
+        self.worker = None
 
     def loadFolder(self):
+        if self.is_busy():
+            return
         # Set the default path for the file dialog to the last used folder, if available
         default_path = self.folder if self.folder else os.getcwd()
         # Show a file dialog to select a folder
         folder = QFileDialog.getExistingDirectory(self, "Select Folder", default_path)
         if folder:
-            # Save the selected folder to the config file
-            with open('config.yaml', 'w') as f:
-                yaml.dump({'folder': folder}, f)
+            # Save the selected folder to the config file. Write a temporary file and swap
+            # it in, so an interrupted write cannot leave a truncated config behind.
+            with open('config.json.tmp', 'w') as f:
+                json.dump({'folder': folder}, f)
+            os.replace('config.json.tmp', 'config.json')
             # Load the image files from the folder into QPixmaps
             self.images = []
             self.image_names = []
             self.image_paths = []
-            self.ref_pixmap = None
-            self.current_pixmap = None
-            for file in os.listdir(folder):
-                if file.endswith(".jpg") or file.endswith(".JPG"):
-                    image_path = os.path.join(folder, file)
-                    self.image_names.append(file)
-                    self.image_paths.append(image_path)
-                    self.images.append(imageio.imread(image_path))
+            self.grey_images = {}
+            self.invalidatePixmaps()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith((".jpg", ".JPG")):
+                        self.image_names.append(entry.name)
+                        self.image_paths.append(entry.path)
+            # JPEG decoding releases the GIL, so the files are decoded in parallel, map keeps their order
+            loaded = list(self.executor.map(load_image, self.image_paths))
+            self.images = [image for image, grey_image in loaded]
+            self.grey_images = {idx: grey_image for idx, (image, grey_image) in enumerate(loaded)}
             # Update the listwidget
             self.update_list_widget(self.image_names)
             # Check if any images were found
@@ -282,6 +512,9 @@ class MainWindow(QMainWindow):
             print("Loaded {} images".format(len(self.images)))
 
     def update_list_widget(self, items):
+        # Fill the list in one go, without a relayout and an item_changed call per item
+        self.image_list.setUpdatesEnabled(False)
+        self.image_list.blockSignals(True)
         self.image_list.clear()
         for idx, item in enumerate(items):
             list_item = QListWidgetItem(item)
@@ -292,8 +525,17 @@ class MainWindow(QMainWindow):
                 list_item.setCheckState(Qt.Checked)
             else:
                 list_item.setCheckState(Qt.Unchecked)
+        self.image_list.blockSignals(False)
+        self.image_list.setUpdatesEnabled(True)
+
+        # The first image is the reference and nothing is selected yet
+        self.ref_image_idx = 0
+        self.current_image_idx = 0
+        self.updatePixmap()
 
     def saveImages(self):
+        if self.is_busy():
+            return
         # Check if there are any images
         if not hasattr(self, 'images'):
             print("No images were found in the selected folder")
@@ -311,73 +553,124 @@ class MainWindow(QMainWindow):
             image_names = [self.image_names[self.current_image_idx]]
 
         if folder:
-            for idx, image in enumerate(image_list):
-                # Save the Image to a file
-                orig_name = image_names[idx][:-4]
-                file_name = f"{orig_name}_reg.jpg"
-                imageio.imwrite(os.path.join(folder, file_name), image)
+            def save(progress, cancel_event):
+                # Save the images to files. JPEG encoding releases the GIL, so they are written in parallel.
+                writes = []
+                for idx, image in enumerate(image_list):
+                    orig_name = image_names[idx][:-4]
+                    file_name = f"{orig_name}_reg.jpg"
+                    writes.append(self.executor.submit(imageio.imwrite, os.path.join(folder, file_name), image))
+
+                for count, write in enumerate(writes, 1):
+                    if cancel_event.is_set():
+                        # Drop the writes that have not started yet
+                        for pending in writes:
+                            pending.cancel()
+                        break
+                    write.result()
+                    progress(count)
+
+            self.startTask('Saving images', len(image_list), save)
 
     def shift_image(self):
+        if self.is_busy():
+            return
         mode = self.sender().text()
         current_im = self.images[self.current_image_idx]
 
-        shift_val = int(self.shift_val.text())
-        rot_val = int(self.rot_val.text())
-
-        if mode == 'Left':
-            current_im = np.roll(current_im, -shift_val, axis=1)
-        elif mode == 'Right':
-            current_im = np.roll(current_im, shift_val, axis=1)
-        elif mode == 'Up':
-            current_im = np.roll(current_im, -shift_val, axis=0)
-        elif mode == 'Down':
-            current_im = np.roll(current_im, shift_val, axis=0)
-        elif mode == 'Rotate Left':
-            current_im = image_edit.rotate_image(current_im, -rot_val)
-        elif mode == 'Rotate Right':
+        # Each button only needs one of the two input fields
+        if mode.startswith('Rotate'):
+            rot_val = int(self.rot_val.text())
+            if mode == 'Rotate Left':
+                rot_val = -rot_val
             current_im = image_edit.rotate_image(current_im, rot_val)
+        else:
+            shift_val = int(self.shift_val.text())
+            axis, direction = {'Left': (1, -1), 'Right': (1, 1), 'Up': (0, -1), 'Down': (0, 1)}[mode]
+            current_im = np.roll(current_im, direction * shift_val, axis=axis)
 
         self.images[self.current_image_idx] = current_im
+        grey_image = self.grey_images.pop(self.current_image_idx, None)
+        # A shifted greyscale image stays valid, a rotated one is converted again when needed
+        if grey_image is not None and not mode.startswith('Rotate'):
+            self.grey_images[self.current_image_idx] = np.roll(grey_image, direction * shift_val, axis=axis)
 
+        self.invalidatePixmaps()
         self.updatePixmap()
 
     def morphImages(self):
+        if self.is_busy():
+            return
         # Check if there are any images
         if not hasattr(self, 'images'):
             print("No images were found in the selected folder")
             return
 
+        # A morph needs two images and at least two frames per pair
+        if len(self.images) < 2:
+            print("At least two images are needed to morph")
+            return
+        frame_rate = int(self.fps.text())
+        if frame_rate < 2:
+            print("The frame rate must be at least 2 to morph")
+            return
+
         default_path = self.folder if self.folder else os.getcwd()
         folder = QFileDialog.getExistingDirectory(self, "Select Folder", default_path)
 
         if folder:
-            frame_rate = int(self.fps.text())
-            counter = 1
-            for idx, img1 in enumerate(self.images):
-                if idx == len(self.images) - 1:
-                    break
+            save_video = self.chk_video.isChecked()
+
+            def morph(progress, cancel_event):
+                frames = self.morph_frames(frame_rate, progress, cancel_event)
+                if save_video:
+                    # ffmpeg encodes the video in its own process, the frames are piped to it in order
+                    with imageio.get_writer(os.path.join(folder, 'morph.mp4'), fps=frame_rate) as video:
+                        for img in frames:
+                            video.append_data(img)
+                    return
+
+                # JPEG encoding releases the GIL, so frames are written in the background
+                # while the next ones are interpolated
+                pending_writes = deque()
+                # Join the folder once, each frame only appends its number
+                frame_prefix = os.path.join(folder, '')
+                for counter, img in enumerate(frames, 1):
+                    # save the images to disk
+                    frame_path = f'{frame_prefix}{counter:03d}.jpg'
+                    pending_writes.append(self.executor.submit(imageio.imwrite, frame_path, img))
 
-                img2 = self.images[idx+1]
+                    # Wait for the oldest write when too many frames are queued, to bound memory use
+                    if len(pending_writes) > MAX_PENDING_WRITES:
+                        pending_writes.popleft().result()
 
-                # Create an empty array to store the interpolated images
-                interpolated_images = []
+                # Wait for the remaining writes and raise any errors they hit
+                for write in pending_writes:
+                    write.result()
 
-                # Interpolate between the two images
-                for i in range(frame_rate - 1):
-                    # Calculate the interpolation factor
-                    alpha = i / (frame_rate - 1)
-                    # Interpolate the pixel values
-                    img = img1 * (1 - alpha) + img2 * alpha
-                    # Convert the interpolated image to 8-bit unsigned integers
-                    img = img.astype(np.uint8)
-                    # save the images to disk
-                    padded_index = str(counter).zfill(3)
-                    print(padded_index)
-                    filename = f'{padded_index}.jpg'
-                    imageio.imwrite(os.path.join(folder, filename), img)
-                    counter += 1
+            self.startTask('Morphing images', len(self.images) - 1, morph)
+
+    def morph_frames(self, frame_rate, progress, cancel_event):
+        # Yield the interpolated frames between each pair of neighbouring images
+        for idx, img1 in enumerate(self.images):
+            if idx == len(self.images) - 1 or cancel_event.is_set():
+                break
+
+            img2 = self.images[idx+1]
+            # Report progress once per image pair instead of once per frame
+            print('Morphing image {} of {}'.format(idx+1, len(self.images)-1))
+
+            # Interpolate between the two images
+            for i in range(frame_rate - 1):
+                if cancel_event.is_set():
+                    break
+                yield image_edit.blend(img1, img2, i / (frame_rate - 1))
+
+            progress(idx + 1)
 
     def registerImages(self):
+        if self.is_busy():
+            return
         # Check if a folder has been selected
         if not hasattr(self, 'folder'):
             print("No folder has been selected")
@@ -388,41 +681,59 @@ class MainWindow(QMainWindow):
             print("No images were found in the selected folder")
             return
 
-        # Convert the images to grayscale
-        grey_images = [np.dot(image[...,:3], [0.2989, 0.5870, 0.1140]) for image in self.images]
-        ref_image = grey_images[self.ref_image_idx]
-        
         mode = self.sender().text()
         if 'all' in mode:
             indices = range(len(self.images))
         else:
             indices = [self.current_image_idx]
+        ref_image_idx = self.ref_image_idx
+        indices = [idx for idx in indices if idx != ref_image_idx]
+        # Nothing to do when only the reference image was selected
+        if not indices:
+            return
 
-        # Register the images against the first image
-        registered_images = []
-        for idx in indices:
-            if idx == self.ref_image_idx:
-                continue
-            xoff, yoff, exoff, eyoff = chi2_shift(
-                ref_image,
-                grey_images[idx],
-                1,
-                return_error=True,
-                upsample_factor='auto'
-            )
-            print('Image {} of {}: Xoff: {}, Yoff: {}'.format(idx+1, len(grey_images), xoff, yoff))
-            corrected_image = np.roll(self.images[idx], (-int(yoff), -int(xoff)), axis=(0, 1)).copy()
-            self.images[idx] = corrected_image
+        def register(progress, cancel_event):
+            # Convert the images to grayscale, reusing the ones left from an earlier registration.
+            # The reference spectrum is computed once and shared by all frames.
+            ref_spectrum = image_edit.reference_spectrum(self.get_grey_image(ref_image_idx))
+            def find_shift(idx):
+                return image_edit.find_shift(ref_spectrum, self.get_grey_image(idx))
+
+            # Register the images against the reference image, spread over all CPU cores.
+            # numpy's FFTs release the GIL, so threads can share the images without copying them.
+            shifted_images = {}
+            offsets = self.executor.map(find_shift, indices)
+            for count, (idx, (xoff, yoff)) in enumerate(zip(indices, offsets), 1):
+                if cancel_event.is_set():
+                    break
+                print('Image {} of {}: Xoff: {}, Yoff: {}'.format(idx+1, len(self.images), xoff, yoff))
+                # Greyscale is per pixel, so shifting the cached greyscale image keeps it valid
+                shifted_images[idx] = (
+                    np.roll(self.images[idx], (-yoff, -xoff), axis=(0, 1)),
+                    np.roll(self.get_grey_image(idx), (-yoff, -xoff), axis=(0, 1)),
+                )
+                progress(count)
+            return shifted_images
+
+        self.startTask('Registering images', len(indices), register, self.finishRegistration)
+
+    def finishRegistration(self, shifted_images):
+        # Swap the shifted images in on the GUI thread, where the display reads them
+        if shifted_images is None:
+            return
+        for idx, (image, grey_image) in shifted_images.items():
+            self.images[idx] = image
+            self.grey_images[idx] = grey_image
 
+        self.invalidatePixmaps()
         self.updatePixmap()
 
     def check_input_is_int(self, default_value):
-        val = self.sender().text()
-        try:
-            val = int(val)
-        except Exception:
+        field = self.sender()
+        # Validate with a precompiled pattern instead of raising and catching a ValueError
+        if INT_PATTERN.fullmatch(field.text()) is None:
             print("Input needs to be an integer")
-            self.sender().setText(default_value)
+            field.setText(default_value)
 
 def on_key_press(event):
     if event.key() in (Qt.Key_Up, Qt.Key_Down, Qt.Key_Left, Qt.Key_Right):